@@ -0,0 +1,33 @@
+"""unique parsed content per file
+
+Revision ID: 7ab09f121a35
+Revises: 3c9e1d2f7a81
+Create Date: 2026-10-17 16:40:12.913205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7ab09f121a35'
+down_revision: Union[str, None] = '3c9e1d2f7a81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 旧版本每次重新解析都会新增一条记录，只保留每个文件最新(id 最大)的一条
+    op.execute(
+        "DELETE FROM parsed_contents WHERE id NOT IN "
+        "(SELECT max_id FROM (SELECT MAX(id) AS max_id FROM parsed_contents GROUP BY file_id, user_id) AS latest)"
+    )
+    op.create_index('ux_parsed_contents_file_id_user_id', 'parsed_contents', ['file_id', 'user_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_parsed_contents_file_id_user_id', table_name='parsed_contents')
@@ -1,18 +1,13 @@
 from fastapi import APIRouter, Query, HTTPException, Depends
-from sqlalchemy import create_engine, or_
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import or_
 from app.models.file import File as FileModel
 from app.models.parsed_content import ParsedContent
-from app.utils.minio_client import minio_client, MINIO_BUCKET
+from app.utils.minio_client import minio_client, MINIO_BUCKET, get_file_url
 from app.utils.user_dep import get_user_id
-import os
+from app.utils.db import SessionLocal
 
 router = APIRouter()
 
-DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./mineru.db')
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
-
 @router.get("/files")
 def list_files(
     page: int = Query(1, ge=1),
@@ -50,11 +45,10 @@ def file_detail(file_id: int, user_id: str = Depends(get_user_id)):
 @router.get("/files/{file_id}/download_url")
 def file_download_url(file_id: int, user_id: str = Depends(get_user_id)):
     db = SessionLocal()
-    file = db.query(FileModel).filter(FileModel.id == file_id, FileModel.user_id == user_id).first()
+    file = db.query(FileModel.minio_path).filter(FileModel.id == file_id, FileModel.user_id == user_id).first()
     db.close()
     if not file:
         raise HTTPException(status_code=404, detail="文件不存在")
-    from app.utils.minio_client import get_file_url
     url = get_file_url(file.minio_path)
     return {"url": url}
 
@@ -1,23 +1,27 @@
 import traceback
-from fastapi import APIRouter, Query, HTTPException, Body, Response, Depends, Request
-from sqlalchemy import create_engine, and_
-from sqlalchemy.orm import sessionmaker
+from fastapi import APIRouter, Query, HTTPException, Body, Response, Depends
+from sqlalchemy import and_
 from app.models.parsed_content import ParsedContent
 from app.models.file import File as FileModel, FileStatus
 from app.services.parser import ParserService
 from app.utils.minio_client import minio_client, MINIO_BUCKET
 from app.utils.user_dep import get_user_id
-import os
+from app.utils.db import SessionLocal
 import io
 import json
 from pathlib import Path
+from datetime import timedelta
 from app.services.parser import get_buckets
 
 router = APIRouter()
 
-DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./mineru.db')
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
+# 解析状态对应的提示信息
+PARSE_STATUS_MESSAGES = {
+    FileStatus.PENDING: "等待解析",
+    FileStatus.PARSING: "正在解析",
+    FileStatus.PARSED: "解析完成",
+    FileStatus.PARSE_FAILED: "解析失败"
+}
 
 @router.get("/files/{file_id}/parsed_content")
 def get_parsed_content(
@@ -26,23 +30,18 @@ def get_parsed_content(
 ):
     db = SessionLocal()
     try:
-        # 检查文件是否存在
-        file = db.query(FileModel).filter(FileModel.id == file_id, FileModel.user_id == user_id).first()
-        if not file:
-            raise HTTPException(status_code=404, detail="文件不存在")
-        
-        # 使用解析服务获取内容
+        # 使用解析服务获取内容，文件不存在时返回 None
         parser = ParserService(db)
         content = parser.get_parsed_content(file_id, user_id)
-        
-        
+        if content is None:
+            raise HTTPException(status_code=404, detail="文件不存在")
+
         return content
     finally:
         db.close()
 
 @router.post("/files/{file_id}/parse")
 def parse_file(
-    request: Request,
     file_id: int,
     user_id: str = Depends(get_user_id)
 ):
@@ -59,16 +58,18 @@ def parse_file(
         elif file.status == FileStatus.PARSING:
             return {"msg": "文件正在解析中"}
         
-        # 执行解析
+        # 投递到解析队列，由 worker 异步解析，不占用请求线程
         parser = ParserService(db)
-        result = parser.parse_file(file, user_id, predictor=request.app.state.predictor)
-        
+        result = parser.queue_parse_file(file, user_id)
+
         return {
-            "msg": "解析完成",
+            "msg": "解析任务已提交",
             "file_id": file_id,
             "details": result
         }
-            
+
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -89,12 +90,7 @@ def get_parse_status(
         return {
             "file_id": file_id,
             "status": file.status.value,
-            "message": {
-                FileStatus.PENDING.value: "等待解析",
-                FileStatus.PARSING.value: "正在解析",
-                FileStatus.PARSED.value: "解析完成",
-                FileStatus.PARSE_FAILED.value: "解析失败"
-            }.get(file.status.value, "未知状态")
+            "message": PARSE_STATUS_MESSAGES.get(file.status, "未知状态")
         }
     finally:
         db.close()
@@ -117,8 +113,10 @@ def export_content(
     """
     db = SessionLocal()
     try:
-        # 检查文件是否存在
-        file = db.query(FileModel).filter(FileModel.id == file_id, FileModel.user_id == user_id).first()
+        # 检查文件是否存在，只取导出需要的列
+        file = db.query(FileModel.minio_path, FileModel.filename).filter(
+            FileModel.id == file_id, FileModel.user_id == user_id
+        ).first()
         if not file:
             raise HTTPException(status_code=404, detail="文件不存在")
         
@@ -140,7 +138,6 @@ def export_content(
             raise HTTPException(status_code=404, detail="导出文件不存在")
         
         # 生成下载URL
-        from datetime import timedelta
         download_url = minio_client.presigned_get_object(
             mds_bucket,
             output_path,
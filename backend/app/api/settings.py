@@ -2,16 +2,10 @@ from fastapi import APIRouter, HTTPException, Depends, Body
 from sqlalchemy.orm import Session
 from app.models.settings import Settings, BackendType
 from app.utils.user_dep import get_user_id
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-import os
+from app.utils.db import SessionLocal
 
 router = APIRouter()
 
-DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./mineru.db')
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
-
 @router.get("/settings")
 def get_settings(user_id: str = Depends(get_user_id)):
     db = SessionLocal()
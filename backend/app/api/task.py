@@ -1,72 +1,27 @@
 from fastapi import APIRouter, HTTPException, Depends, Body
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from app.models.task import Task
-from app.models.file import File as FileModel
+from app.models.file import File as FileModel, FileStatus
 from app.services.parser import ParserService
 from app.utils.user_dep import get_user_id
-import os
-import threading
-import time
+from app.utils.db import SessionLocal
 
 router = APIRouter()
 
-DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./mineru.db')
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
-
-# 后台任务执行
-TASK_THREAD_POOL = {}
-
-def run_parse_task(task_id, user_id, file_id):
-    db = SessionLocal()
-    try:
-        task = db.query(Task).filter(Task.id == task_id, Task.user_id == user_id).first()
-        if not task:
-            return
-        
-        task.status = 'running'
-        db.commit()
-        
-        # 获取文件信息
-        file = db.query(FileModel).filter(FileModel.id == file_id, FileModel.user_id == user_id).first()
-        if not file:
-            task.status = 'failed'
-            task.result = '文件不存在'
-            db.commit()
-            return
-        
-        # 创建解析服务
-        parser = ParserService(db)
-        
-        # 开始解析
-        results = parser.parse_pdf(file, user_id)
-        
-        # 更新文件状态
-        file.status = 'parsed'
-        db.commit()
-        
-        # 更新任务状态
-        task.status = 'success'
-        task.progress = 1.0
-        task.result = f'成功解析 {len(results)} 页内容'
-        db.commit()
-        
-    except Exception as e:
-        task.status = 'failed'
-        task.result = str(e)
-        db.commit()
-    finally:
-        db.close()
-
 @router.post("/tasks/parse")
 def submit_parse_task(file_id: int = Body(...), user_id: str = Depends(get_user_id)):
     db = SessionLocal()
+    task_id = None
     try:
         # 检查文件是否存在
         file = db.query(FileModel).filter(FileModel.id == file_id, FileModel.user_id == user_id).first()
         if not file:
             raise HTTPException(status_code=404, detail="文件不存在")
+
+        # 检查文件状态，避免同一文件被并发解析
+        if file.status == FileStatus.PARSED:
+            raise HTTPException(status_code=400, detail="文件已解析完成")
+        elif file.status == FileStatus.PARSING:
+            raise HTTPException(status_code=400, detail="文件正在解析中")
         
         # 检查是否已有正在进行的解析任务
         existing_task = db.query(Task).filter(
@@ -90,18 +45,22 @@ def submit_parse_task(file_id: int = Body(...), user_id: str = Depends(get_user_
         db.add(task)
         db.commit()
         db.refresh(task)
+        task_id = task.id
         
-        # 启动后台线程
-        t = threading.Thread(target=run_parse_task, args=(task.id, user_id, file_id))
-        t.start()
-        TASK_THREAD_POOL[task.id] = t
+        # 投递到 Redis Stream，由解析 worker 消费并回写任务状态
+        parser = ParserService(db)
+        parser.queue_parse_file(file, user_id, task_id=task_id)
         
-        return {"task_id": task.id}
+        return {"task_id": task_id}
         
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
+        # 任务已落库但投递失败时标记为失败，否则该文件无法再次提交解析
+        if task_id is not None:
+            db.query(Task).filter(Task.id == task_id).update({'status': 'failed', 'result': str(e)})
+            db.commit()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         db.close()
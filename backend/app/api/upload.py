@@ -3,11 +3,10 @@ from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.models.file import File as FileModel, FileStatus, BackendType as FileBackendType
 from app.models.settings import Settings, BackendType
-from app.utils.minio_client import upload_file
+from app.utils.minio_client import upload_file, remove_files
 from app.utils.user_dep import get_user_id
+from app.utils.db import SessionLocal
 from app.services.parser import ParserService
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 import os
 import uuid
 from datetime import datetime
@@ -15,68 +14,87 @@ from typing import List
 
 router = APIRouter()
 
-DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./mineru.db')
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
-
 @router.post("/upload")
-async def upload_files(
+def upload_files(
     files: List[UploadFile] = File(...),
     user_id: str = Depends(get_user_id)
 ):
-    db = SessionLocal()
-    results = []
-    
-    for file in files:
+    # 新建的记录在提交后仍然可用，避免逐个 refresh 再查询一次数据库
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        db_files = []
+        # 本批次已上传到 MinIO 的对象，整批回滚时一并删除
+        uploaded_paths = []
+        
+        # 用户设置对整批文件相同，只查询一次
+        settings = db.query(Settings).filter(Settings.user_id == user_id).first()
+        backend = FileBackendType.PIPELINE
+        if settings:
+            if settings.backend == BackendType.PIPELINE:
+                backend = FileBackendType.PIPELINE
+            else:
+                backend = FileBackendType.VLM
+        
+        for file in files:
+            try:
+                # 生成唯一文件名
+                ext = os.path.splitext(file.filename)[1]
+                unique_filename = f"{uuid.uuid4()}{ext}"
+                
+                # 保存到 MinIO
+                upload_file(
+                    file.file,
+                    unique_filename,
+                    file.content_type,
+                    length=file.size if file.size is not None else -1
+                )
+                uploaded_paths.append(unique_filename)
+                
+                # 保存到数据库，整批上传只提交一次事务
+                db_file = FileModel(
+                    user_id=user_id,
+                    filename=file.filename,
+                    size=file.size,
+                    status=FileStatus.PENDING,
+                    upload_time=datetime.utcnow(),
+                    minio_path=unique_filename,
+                    content_type=file.content_type,
+                    backend=backend
+                )
+                db.add(db_file)
+                db_files.append(db_file)
+                
+            except Exception as e:
+                db.rollback()
+                remove_files(uploaded_paths)
+                traceback.print_exc()
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"文件 {file.filename} 上传失败，本批次 {len(files)} 个文件均未保存: {str(e)}"
+                )
+        
         try:
-            # 生成唯一文件名
-            ext = os.path.splitext(file.filename)[1]
-            unique_filename = f"{uuid.uuid4()}{ext}"
-            
-            # 保存到 MinIO
-            upload_file(
-                file.file,
-                unique_filename,
-                file.content_type
-            )
-            settings = db.query(Settings).filter(Settings.user_id == user_id).first()
-            backend = FileBackendType.PIPELINE
-            if settings:
-            
-                if settings.backend == BackendType.PIPELINE:
-                    backend = FileBackendType.PIPELINE
-                else:
-                    backend = FileBackendType.VLM
-
-            
-            # 保存到数据库
-            db_file = FileModel(
-                user_id=user_id,
-                filename=file.filename,
-                size=file.size,
-                status=FileStatus.PENDING,
-                upload_time=datetime.utcnow(),
-                minio_path=unique_filename,
-                content_type=file.content_type,
-                backend=backend
-            )
-            db.add(db_file)
             db.commit()
-            db.refresh(db_file)
-            
-            # 将解析任务加入队列
-            parser_service = ParserService(db)
-            parser_service.queue_parse_file(db_file, user_id)
-            
-            results.append(db_file.to_dict())
-            
         except Exception as e:
             db.rollback()
+            remove_files(uploaded_paths)
             traceback.print_exc()
-            raise HTTPException(status_code=500, detail=f"文件 {file.filename} 上传失败: {str(e)}")
-    
-    db.close()
-    return {
-        "total": len(results),
-        "files": results
-    } 
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
+        
+        # 事务提交后再将解析任务加入队列，保证 worker 能读到文件记录
+        parser_service = ParserService(db)
+        results = []
+        for db_file in db_files:
+            try:
+                parser_service.queue_parse_file(db_file, user_id)
+            except Exception:
+                # 投递失败时 queue_parse_file 已将该文件标记为解析失败，继续投递其余文件
+                traceback.print_exc()
+            results.append(db_file.to_dict())
+        
+        return {
+            "total": len(results),
+            "files": results
+        }
+    finally:
+        db.close()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from app.models.base import Base
 from datetime import datetime
@@ -18,7 +18,7 @@ class File(Base):
     __tablename__ = 'files'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(String(64), nullable=False, index=True)
+    user_id = Column(String(64), nullable=False)
     filename = Column(String(256), nullable=False)
     size = Column(Integer, nullable=False)
     status = Column(Enum(FileStatus), default=FileStatus.PENDING)
@@ -30,6 +30,11 @@ class File(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # 文件列表按用户筛选并按上传时间倒序分页，前缀 user_id 同时覆盖按用户的单列查询
+    __table_args__ = (
+        Index('ix_files_user_id_upload_time', 'user_id', 'upload_time'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Index
 from app.models.base import Base
 from datetime import datetime
 
 class ParsedContent(Base):
     __tablename__ = 'parsed_contents'
+    # 每个文件只保留一条解析结果，重新解析时原地更新
+    __table_args__ = (
+        Index('ux_parsed_contents_file_id_user_id', 'file_id', 'user_id', unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(64), nullable=False, index=True)
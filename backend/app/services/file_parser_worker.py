@@ -11,11 +11,11 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 sys.path.append(PROJECT_ROOT)
 
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 from app.utils.redis_client import redis_client
+from app.utils.db import SessionLocal
 from app.models.file import File as FileModel, FileStatus
+from app.models.task import Task
 from app.services.parser import ParserService
 
 
@@ -26,10 +26,6 @@ def clean_memory():
         torch.cuda.ipc_collect()
     gc.collect()
 
-# 数据库连接配置
-DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./mineru.db')
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
 # 批处理文件数
 WORK_BATCH = os.getenv("WORK_BATCH", 1)
 
@@ -42,24 +38,43 @@ def process_task(task_data: dict, db: Session):
     """
     处理单个解析任务
     Args:
-        task_data (dict): 任务数据，包含 file_id, user_id, parse_method
+        task_data (dict): 任务数据，包含 file_id, user_id, parse_method, 可选 task_id
         db (Session): 数据库会话
     """
+    file = None
+    task = None
     try:
         file_id = task_data.get("file_id")
         user_id = task_data.get("user_id")
         parse_method = task_data.get("parse_method", "auto")
+        task_id = task_data.get("task_id")
+
+        # 通过 /tasks/parse 提交的任务需要回写任务状态，先取出任务以便提前退出时也能标记失败
+        if task_id:
+            task = db.query(Task).filter(Task.id == task_id).first()
 
         if not file_id or not user_id:
             logger.error(f"Invalid task data: {task_data}")
+            if task:
+                task.status = 'failed'
+                task.result = '任务数据无效'
+                db.commit()
             return
 
         # 获取文件记录
         file = db.query(FileModel).filter(FileModel.id == file_id).first()
         if not file:
             logger.error(f"File not found: {file_id}")
+            if task:
+                task.status = 'failed'
+                task.result = '文件不存在'
+                db.commit()
             return
 
+        if task:
+            task.status = 'running'
+            db.commit()
+
         # 创建解析服务实例
         parser_service = ParserService(db)
 
@@ -68,12 +83,23 @@ def process_task(task_data: dict, db: Session):
         result = parser_service.parse_file(file, user_id, parse_method)
         logger.info(f"File {file_id} processed successfully: {result}")
 
+        if task:
+            task.status = 'success'
+            task.progress = 1.0
+            task.result = '解析完成'
+            db.commit()
+
     except Exception as e:
         logger.error(f"Error processing task {task_data}: {str(e)}")
+        # 先回滚，数据库自身出错时会话才能继续提交
+        db.rollback()
         # 如果解析失败，更新文件状态
         if file:
             file.status = FileStatus.PARSE_FAILED
-            db.commit()
+        if task:
+            task.status = 'failed'
+            task.result = str(e)
+        db.commit()
 
 def run_worker():
     """
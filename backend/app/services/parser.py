@@ -1,20 +1,22 @@
 import os
-from typing import List, Dict, Any, Union, Tuple
+from typing import List, Dict, Any, Union, Tuple, Optional
 import sys
 import json
 import re
 import copy
 from io import StringIO
 from pathlib import Path
+from functools import lru_cache
 from loguru import logger
 from mineru.utils.pdf_image_tools import images_bytes_to_pdf_bytes
 
 # PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
 # sys.path.append(PROJECT_ROOT)
 
-from app.utils.minio_client import minio_client, MINIO_BUCKET
+from app.utils.minio_client import minio_client, MINIO_BUCKET, ensure_bucket
 from app.models.parsed_content import ParsedContent
 from app.models.file import File as FileModel, FileStatus
+from sqlalchemy import and_
 from sqlalchemy.orm import Session
 from mineru.data.data_reader_writer import DataWriter
 from mineru.data.data_reader_writer.s3 import S3DataWriter
@@ -36,6 +38,8 @@ PDF_EXTENSIONS = [".pdf"]
 # 2.0取消了liboffice套件，只支持pdf和图片
 # OFFICE_EXTENSIONS = [".ppt", ".pptx", ".doc", ".docx"]
 IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg"]
+# 支持的全部扩展名，模块加载时合并一次，校验时单次集合查找
+SUPPORTED_EXTENSIONS = frozenset(PDF_EXTENSIONS + IMAGE_EXTENSIONS)
 
 # Redis 频道名称
 PARSER_CHANNEL = "file_parser_tasks"
@@ -44,6 +48,13 @@ CONSUMER_GROUP = "parser_workers"
 
 SERVER_URL = os.environ.get("SERVER_URL", "http://127.0.0.1:30000")
 
+# 匹配Markdown中的图片标签，模块加载时编译一次
+MARKDOWN_IMAGE_PATTERN = re.compile(r'\!\[(?:[^\]]*)\]\(([^)]+)\)')
+
+# mineru 的配置读取每次都会打开并解析 json 文件，进程运行期间配置不变，缓存结果
+_read_config = lru_cache(maxsize=1)(read_config)
+_get_s3_config = lru_cache(maxsize=None)(get_s3_config)
+
 class MemoryDataWriter(DataWriter):
     """内存数据写入器，用于临时存储解析结果"""
 
@@ -66,10 +77,11 @@ class MemoryDataWriter(DataWriter):
         self.buffer.close()
 
 
-def get_s3_image_url(image_path: str, bucket: str) -> str:
+def get_s3_image_url(image_path: str, bucket: str, endpoint: Optional[str] = None) -> str:
     """Get HTTP accessible image URL from S3"""
-    # 获取S3配置
-    _, _, endpoint = get_s3_config(bucket)
+    # 获取S3配置，调用方已解析过endpoint时直接复用
+    if endpoint is None:
+        _, _, endpoint = _get_s3_config(bucket)
 
     # 直接使用endpoint和image_path构建URL
     return f"{endpoint}/{bucket}/{image_path}"
@@ -77,8 +89,8 @@ def get_s3_image_url(image_path: str, bucket: str) -> str:
 
 def modify_markdown_image_urls(markdown_content: str, bucket: str) -> str:
     """修改Markdown内容中的图片URL为S3 HTTP URL"""
-    # 匹配Markdown中的图片标签
-    pattern = r'\!\[(?:[^\]]*)\]\(([^)]+)\)'
+    # 这里只解析一次endpoint供所有图片复用
+    _, _, endpoint = _get_s3_config(bucket)
 
     def replace_url(match):
         image_path = match.group(1)
@@ -86,16 +98,15 @@ def modify_markdown_image_urls(markdown_content: str, bucket: str) -> str:
         if image_path.startswith(('http://', 'https://')):
             return match.group(0)
         # 否则转换为S3 URL
-        print(image_path, '---')
-        return f'![]({get_s3_image_url(image_path, bucket)})'
+        return f'![]({get_s3_image_url(image_path, bucket, endpoint)})'
 
     # 应用替换
-    return re.sub(pattern, replace_url, markdown_content)
+    return MARKDOWN_IMAGE_PATTERN.sub(replace_url, markdown_content)
 
 
 def get_buckets() -> list[str]:
     """获取默认bucket"""
-    config = read_config()
+    config = _read_config()
     bucket_info = config.get('bucket_info', {})
     if not bucket_info:
         raise Exception('未找到bucket配置信息')
@@ -155,35 +166,20 @@ class ParserService:
                 _ocr_enable = ocr_enabled_list[idx]
                 middle_json = pipeline_result_to_middle_json(model_list, images_list, pdf_doc, image_writer, _lang,
                                                              _ocr_enable, p_formula_enable)
-                pdf_info = middle_json["pdf_info"]
-
-                if f_dump_md:
-                    md_content_str = pipeline_union_make(pdf_info, f_make_md_mode, "images")
-                    md_content_str = modify_markdown_image_urls(md_content_str, mds_bucket)
+                md_content_str = ParserService._dump_parse_result(
+                    pdf_file_name,
+                    middle_json,
+                    pipeline_union_make,
+                    md_writer=md_writer,
+                    mds_bucket=mds_bucket,
+                    f_dump_md=f_dump_md,
+                    f_dump_middle_json=f_dump_middle_json,
+                    f_dump_content_list=f_dump_content_list,
+                    f_make_md_mode=f_make_md_mode,
+                    f_md_from_pages=True,
+                )
+                if md_content_str is not None:
                     md_content_list.append(md_content_str)
-                    md_writer.write_string(
-                        f"{pdf_file_name}.md",
-                        md_content_str,
-                    )
-                    md_content_with_pages = ParserService.convert_middle_json_to_markdown(middle_json, keep_page=True)
-                    md_content_with_pages = modify_markdown_image_urls(md_content_with_pages, mds_bucket)
-                    md_writer.write_string(
-                        f"{pdf_file_name}_pages.md",
-                        md_content_with_pages,
-                    )
-
-                if f_dump_content_list:
-                    content_list = pipeline_union_make(pdf_info, MakeMode.CONTENT_LIST, "images")
-                    md_writer.write_string(
-                        f"{pdf_file_name}_content_list.json",
-                        json.dumps(content_list, ensure_ascii=False, indent=4),
-                    )
-
-                if f_dump_middle_json:
-                    md_writer.write_string(
-                        f"{pdf_file_name}_middle.json",
-                        json.dumps(middle_json, ensure_ascii=False, indent=4),
-                    )
 
                 if f_dump_model_output:
                     md_writer.write_string(
@@ -194,42 +190,26 @@ class ParserService:
         else:
             if backend.startswith("vlm-"):
                 backend = backend[4:]
-            conf = read_config()
+            conf = _read_config()
             model_path = conf.get("models-dir", {}).get("vlm", '')
             for idx, pdf_bytes in enumerate(pdf_bytes_list):
                 pdf_file_name = pdf_file_names[idx]
                 pdf_bytes = convert_pdf_bytes_to_bytes_by_pypdfium2(pdf_bytes, start_page_id, end_page_id)
                 middle_json, infer_result = vlm_doc_analyze(pdf_bytes, image_writer=image_writer, predictor=predictor, backend=backend,
                                                              model_path=model_path, server_url=server_url)
-                pdf_info = middle_json["pdf_info"]
-
-                if f_dump_md:
-                    md_content_str = vlm_union_make(pdf_info, f_make_md_mode, "images")
-                    md_content_str = modify_markdown_image_urls(md_content_str, mds_bucket)
+                md_content_str = ParserService._dump_parse_result(
+                    pdf_file_name,
+                    middle_json,
+                    vlm_union_make,
+                    md_writer=md_writer,
+                    mds_bucket=mds_bucket,
+                    f_dump_md=f_dump_md,
+                    f_dump_middle_json=f_dump_middle_json,
+                    f_dump_content_list=f_dump_content_list,
+                    f_make_md_mode=f_make_md_mode,
+                )
+                if md_content_str is not None:
                     md_content_list.append(md_content_str)
-                    md_writer.write_string(
-                        f"{pdf_file_name}.md",
-                        md_content_str,
-                    )
-                    md_content_with_pages = ParserService.convert_middle_json_to_markdown(middle_json, keep_page=True)
-                    md_content_with_pages = modify_markdown_image_urls(md_content_with_pages, mds_bucket)
-                    md_writer.write_string(
-                        f"{pdf_file_name}_pages.md",
-                        md_content_with_pages,
-                    )
-
-                if f_dump_content_list:
-                    content_list = vlm_union_make(pdf_info, MakeMode.CONTENT_LIST, "images")
-                    md_writer.write_string(
-                        f"{pdf_file_name}_content_list.json",
-                        json.dumps(content_list, ensure_ascii=False, indent=4),
-                    )
-
-                if f_dump_middle_json:
-                    md_writer.write_string(
-                        f"{pdf_file_name}_middle.json",
-                        json.dumps(middle_json, ensure_ascii=False, indent=4),
-                    )
 
                 if f_dump_model_output:
                     model_output = ("\n" + "-" * 50 + "\n").join(infer_result)
@@ -240,27 +220,101 @@ class ParserService:
         return md_content_list
 
     @staticmethod
-    def convert_middle_json_to_markdown(middle_json: Dict[str, Any], keep_page: bool = True) -> str:
-        """将 middle_json 转换为 markdown 格式
+    def _dump_parse_result(
+            pdf_file_name: str,
+            middle_json: Dict[str, Any],
+            union_make,
+            md_writer: DataWriter,
+            mds_bucket: str,
+            f_dump_md: bool,
+            f_dump_middle_json: bool,
+            f_dump_content_list: bool,
+            f_make_md_mode=MakeMode.MM_MD,
+            f_md_from_pages: bool = False,
+    ) -> Optional[str]:
+        """写出 pipeline / vlm 共用的解析结果文件
         Args:
+            pdf_file_name: 文件名 stem
             middle_json: 中间 JSON 数据
-            keep_page: 是否保留页码信息
+            union_make: 对应后端的 union_make 函数
+            md_writer: markdown写入器
+            mds_bucket: md存储桶
+            f_dump_md: 是否写出 markdown 及带页码的 markdown
+            f_dump_middle_json: 是否写出 middle_json
+            f_dump_content_list: 是否写出 content_list
+            f_make_md_mode: 生成 markdown 的模式
+            f_md_from_pages: union_make 的 MM_MD 结果是否就是各页 markdown 的拼接(pipeline 为 True)
         Returns:
-            str: 转换后的 markdown 内容
+            Optional[str]: 生成的 markdown 内容，未生成时返回 None
         """
-        pdf_info_dict = middle_json.get('pdf_info', [])
-        output_content = []
-        for page_info in pdf_info_dict:
+        pdf_info = middle_json["pdf_info"]
+        md_content_str = None
+
+        if f_dump_md:
+            if f_md_from_pages and f_make_md_mode == MakeMode.MM_MD:
+                # MM_MD 结果就是各页 markdown 的拼接，一次遍历同时生成两份，避免每页渲染两次
+                md_content_str, md_content_with_pages = ParserService._make_markdown_with_pages(pdf_info)
+            else:
+                md_content_str = union_make(pdf_info, f_make_md_mode, "images")
+                md_content_with_pages = ParserService.convert_middle_json_to_markdown(middle_json, keep_page=True)
+            md_content_str = modify_markdown_image_urls(md_content_str, mds_bucket)
+            md_writer.write_string(
+                f"{pdf_file_name}.md",
+                md_content_str,
+            )
+            md_content_with_pages = modify_markdown_image_urls(md_content_with_pages, mds_bucket)
+            md_writer.write_string(
+                f"{pdf_file_name}_pages.md",
+                md_content_with_pages,
+            )
+
+        if f_dump_content_list:
+            content_list = union_make(pdf_info, MakeMode.CONTENT_LIST, "images")
+            md_writer.write_string(
+                f"{pdf_file_name}_content_list.json",
+                json.dumps(content_list, ensure_ascii=False, indent=4),
+            )
+
+        if f_dump_middle_json:
+            md_writer.write_string(
+                f"{pdf_file_name}_middle.json",
+                json.dumps(middle_json, ensure_ascii=False, indent=4),
+            )
+
+        return md_content_str
+
+    @staticmethod
+    def _make_markdown_with_pages(pdf_info: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """一次遍历 pdf_info，同时生成不带页码和带页码的 markdown
+        Args:
+            pdf_info: middle_json 中的 pdf_info
+        Returns:
+            Tuple[str, str]: (markdown 内容, 带页码的 markdown 内容)
+        """
+        md_parts = []
+        page_parts = []
+        for page_info in pdf_info:
             paras_of_layout = page_info.get('para_blocks')
-            page_idx = page_info.get('page_idx')
             if not paras_of_layout:
                 continue
 
             page_markdown = make_blocks_to_markdown(paras_of_layout, MakeMode.MM_MD, "images")
-            if keep_page:
-                output_content.append(f"{{{page_idx}}}{'-' * 48}")
-            output_content.extend(page_markdown)
-        return '\n\n'.join(output_content)
+            md_parts.extend(page_markdown)
+            page_parts.append(f"{{{page_info.get('page_idx')}}}{'-' * 48}")
+            page_parts.extend(page_markdown)
+        return '\n\n'.join(md_parts), '\n\n'.join(page_parts)
+
+    @staticmethod
+    def convert_middle_json_to_markdown(middle_json: Dict[str, Any], keep_page: bool = True) -> str:
+        """将 middle_json 转换为 markdown 格式
+        Args:
+            middle_json: 中间 JSON 数据
+            keep_page: 是否保留页码信息
+        Returns:
+            str: 转换后的 markdown 内容
+        """
+        md_content, md_content_with_pages = ParserService._make_markdown_with_pages(middle_json.get('pdf_info', []))
+        return md_content_with_pages if keep_page else md_content
 
     def process_file(
             self,
@@ -297,7 +351,7 @@ class ParserService:
 
         try:
             # 检查文件类型是否支持
-            if file_extension not in PDF_EXTENSIONS + IMAGE_EXTENSIONS:
+            if file_extension not in SUPPORTED_EXTENSIONS:
                 raise ValueError(f"不支持的文件类型: {file_extension}")
             file_name_list = [file_name]
             if file_extension in IMAGE_EXTENSIONS:
@@ -326,7 +380,7 @@ class ParserService:
             raise
 
     def parse_file(self, file: FileModel, user_id: str, parse_method: str = "auto", predictor=None) -> Dict[str, Any]:
-        """同步解析文件"""
+        """同步解析文件，predictor 为空时由 mineru 的 ModelSingleton 按需加载并缓存模型"""
         try:
             # 获取用户设置，如果没有则使用默认配置
             user_settings = self.db.query(Settings).filter(Settings.user_id == user_id).first()
@@ -350,7 +404,12 @@ class ParserService:
 
             # 从MinIO获取文件
             response = minio_client.get_object(MINIO_BUCKET, file.minio_path)
-            file_bytes = response.read()
+            try:
+                file_bytes = response.read()
+            finally:
+                # 归还连接到 minio 客户端的连接池
+                response.close()
+                response.release_conn()
             file_extension = Path(file.minio_path).suffix.lower()
             file_name = Path(file.minio_path).name
             file_name_stem = Path(file_name).stem
@@ -358,9 +417,8 @@ class ParserService:
             buckets = get_buckets()
             # 默认读取第一个bucket配置存储生成的markdown，保持output.md和images文件夹在同级目录
             mds_bucket = buckets[0]
-            if not minio_client.bucket_exists(mds_bucket):
-                minio_client.make_bucket(mds_bucket)
-            ak, sk, endpoint = get_s3_config(mds_bucket)
+            ensure_bucket(mds_bucket)
+            ak, sk, endpoint = _get_s3_config(mds_bucket)
             # TODO 增加本地文件夹存储选配
             md_content_writer_s3 = S3DataWriter(
                 "",
@@ -395,13 +453,21 @@ class ParserService:
                     mds_bucket=mds_bucket,
                     predictor=predictor
                 )
-                # 保存解析结果到数据库
-                parsed_content = ParsedContent(
-                    user_id=user_id,
-                    file_id=file.id,
-                    content=md_content_list[0]
-                )
-                self.db.add(parsed_content)
+                # 保存解析结果到数据库，重新解析时更新已有记录，内容未变化则不写入
+                md_content = md_content_list[0]
+                parsed_content = self.db.query(ParsedContent).filter(
+                    ParsedContent.file_id == file.id,
+                    ParsedContent.user_id == user_id
+                ).order_by(ParsedContent.id.desc()).first()
+                if parsed_content is None:
+                    parsed_content = ParsedContent(
+                        user_id=user_id,
+                        file_id=file.id,
+                        content=md_content
+                    )
+                    self.db.add(parsed_content)
+                elif parsed_content.content != md_content:
+                    parsed_content.content = md_content
 
                 # 更新文件状态为已解析
                 file.status = FileStatus.PARSED
@@ -421,31 +487,38 @@ class ParserService:
             self.db.commit()
             raise Exception(f"解析失败: {str(e)}")
 
-    def get_parsed_content(self, file_id: int, user_id: str):
-        """获取已解析的内容"""
-        query = self.db.query(ParsedContent).filter(
-            ParsedContent.file_id == file_id,
-            ParsedContent.user_id == user_id
-        )
-
-        content_obj = query.first()
-
-        return content_obj.content if content_obj else ""
-
-    def queue_parse_file(self, file: FileModel, user_id: str, parse_method: str = "auto") -> Dict[str, Any]:
+    def get_parsed_content(self, file_id: int, user_id: str) -> Optional[str]:
+        """获取已解析的内容，文件校验和内容一次查询取回
+        Returns:
+            Optional[str]: 文件不存在时返回 None，未解析时返回空字符串
+        """
+        row = self.db.query(FileModel.id, ParsedContent.content).outerjoin(
+            ParsedContent,
+            and_(ParsedContent.file_id == FileModel.id, ParsedContent.user_id == user_id)
+        ).filter(FileModel.id == file_id, FileModel.user_id == user_id) \
+            .order_by(ParsedContent.id.desc()).first()
+
+        if row is None:
+            return None
+        return row.content or ""
+
+    def queue_parse_file(self, file: FileModel, user_id: str, parse_method: str = "auto",
+                         task_id: Optional[int] = None) -> Dict[str, Any]:
         """
         将文件解析任务发布到 Redis Stream
         Args:
             file (FileModel): 文件模型实例
             user_id (str): 用户ID
             parse_method (str): 解析方法，可选值：auto, ocr, txt
+            task_id (Optional[int]): 关联的任务ID，worker 会回写该任务的状态
         Returns:
             Dict[str, Any]: 包含任务状态的字典
         """
         try:
-            # 更新文件状态为等待解析
-            file.status = FileStatus.PENDING
-            self.db.commit()
+            # 更新文件状态为等待解析，状态未变化时无需再提交一次事务
+            if file.status != FileStatus.PENDING:
+                file.status = FileStatus.PENDING
+                self.db.commit()
 
             # 准备任务数据
             task_data = {
@@ -453,6 +526,8 @@ class ParserService:
                 "user_id": user_id,
                 "parse_method": parse_method
             }
+            if task_id is not None:
+                task_data["task_id"] = task_id
 
             # 发布任务到 Redis Stream
             logger.info(f"Publishing task to stream {PARSER_STREAM}: {task_data}")
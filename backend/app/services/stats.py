@@ -1,6 +1,6 @@
 from datetime import datetime, date
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, case
 from ..models.file import File
 
 class StatsService:
@@ -9,19 +9,13 @@ class StatsService:
 
     def get_stats(self) -> dict:
         """获取统计数据"""
-        # 计算总文件数
-        total_files = self.db.query(File).count()
-
-        # 计算今日上传数
-        today = date.today()
-        today_uploads = self.db.query(File).filter(
-            File.upload_time >= datetime.combine(today, datetime.min.time())
-        ).count()
-
-        # 计算已用空间（MB）
-        used_space = self.db.query(File).with_entities(
-            func.sum(File.size)
-        ).scalar() or 0
+        # 总文件数、今日上传数、已用空间在一次查询中聚合
+        today_start = datetime.combine(date.today(), datetime.min.time())
+        total_files, today_uploads, used_space = self.db.query(
+            func.count(File.id),
+            func.count(case((File.upload_time >= today_start, 1))),
+            func.coalesce(func.sum(File.size), 0)
+        ).one()
         used_space = round(used_space / (1024 * 1024), 2)  # 转换为MB
 
         return {
@@ -0,0 +1,10 @@
+import os
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./mineru.db')
+
+# 进程内共享同一个 engine 和连接池，各路由不再各自创建
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith('sqlite') else {}
+engine = create_engine(DATABASE_URL, connect_args=connect_args)
+SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
@@ -16,24 +16,41 @@ minio_client = Minio(
     secure=MINIO_SECURE
 )
 
-def ensure_bucket():
-    if not minio_client.bucket_exists(MINIO_BUCKET):
-        minio_client.make_bucket(MINIO_BUCKET)
+# 已确认存在的 bucket，进程内只检查一次
+_ensured_buckets = set()
 
 
-def upload_file(file_obj, filename, content_type=None):
+def ensure_bucket(bucket=MINIO_BUCKET):
+    if bucket in _ensured_buckets:
+        return
+    if not minio_client.bucket_exists(bucket):
+        minio_client.make_bucket(bucket)
+    _ensured_buckets.add(bucket)
+
+
+def upload_file(file_obj, filename, content_type=None, length=-1):
+    # 已知长度时直接流式上传，未知长度(-1)才按 part_size 分块缓冲
     ensure_bucket()
     minio_path = filename
     minio_client.put_object(
         MINIO_BUCKET,
         minio_path,
         file_obj,
-        length=-1,
+        length=length,
         part_size=10*1024*1024,
         content_type=content_type
     )
     return minio_path
 
 
+def remove_files(filenames):
+    # 尽力删除，单个对象删除失败不影响其余对象
+    for filename in filenames:
+        try:
+            minio_client.remove_object(MINIO_BUCKET, filename)
+        except Exception:
+            pass
+
+
 def get_file_url(minio_path, expires=3600):
     return minio_client.presigned_get_object(MINIO_BUCKET, minio_path, expires=timedelta(seconds=expires)) 
\ No newline at end of file
@@ -1,4 +1,3 @@
-import os
 import torch
 import gc
 from fastapi import FastAPI
@@ -10,11 +9,6 @@ from contextlib import asynccontextmanager
 from mineru.cli.fast_api import parse_pdf
 
 
-BACKEND = os.environ.get("BACKEND", "sglang-client")
-MODEL_PATH = os.environ.get("MODEL_PATH", "/models/vlm")
-SERVER_URL = os.environ.get("SERVER_URL", "http://127.0.0.1:30000")
-PRELOAD_MODEL = os.environ.get("PRELOAD_MODEL", False)
-
 def clean_memory():
     if torch.cuda.is_available():
         torch.cuda.empty_cache()
@@ -23,17 +17,9 @@ def clean_memory():
 
 @asynccontextmanager
 async def life_span(app: FastAPI):
-    if not PRELOAD_MODEL:
-        print("🔄 不预加载模型...")
-        app.state.predictor = None
-    else:
-        print("🔄 正在加载模型...")
-        from mineru.backend.vlm.vlm_analyze import ModelSingleton
-
-        app.state.predictor = ModelSingleton().get_model(BACKEND, MODEL_PATH, SERVER_URL)
-        print("✅ 模型加载完成")
+    # 文件解析已统一投递给 worker 进程，API 进程不再预加载 vlm 模型
     yield
-    print("🚪 应用退出，清理模型")
+    print("🚪 应用退出，清理内存")
     clean_memory()
 
 